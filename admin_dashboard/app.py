@@ -1,27 +1,49 @@
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
 
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from jose import jwt, JWTError
+from cachetools import TTLCache
+import orjson
+import jwt
+from jwt import InvalidTokenError
 from passlib.context import CryptContext
 
 from signal_controller.controller import SignalController
 from traffic_analyzer.analyzer import TrafficAnalyzer
 from database.manager import DatabaseManager
-from config.settings import SECURITY
+from config.settings import DASHBOARD, SECURITY
 
 # Security configuration
 SECRET_KEY = SECURITY["secret_key"]
 ALGORITHM = SECURITY["algorithm"]
 ACCESS_TOKEN_EXPIRE_MINUTES = SECURITY["access_token_expire_minutes"]
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing - new hashes use argon2 (libargon2 via argon2-cffi);
+# existing bcrypt hashes still verify and are flagged for re-hashing
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Password hashing is deliberately slow, so it runs on its own small pool
+# instead of blocking the event loop or starving the default executor
+crypto_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="crypto")
+
+# Decoded tokens keyed by SHA-256 of the token, holding (username, exp) so
+# repeat requests skip signature verification until the token expires
+token_cache = TTLCache(maxsize=1024, ttl=60)
+
+class OrjsonResponse(JSONResponse):
+    """JSON response rendered with orjson, including NumPy arrays."""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
 # Models
 class Token(BaseModel):
     access_token: str
@@ -55,15 +77,18 @@ fake_users_db = {
 
 def create_dashboard_app(system) -> FastAPI:
     """Create and configure the FastAPI application."""
-    app = FastAPI(title="Traffic Light Control Dashboard")
+    app = FastAPI(
+        title="Traffic Light Control Dashboard",
+        default_response_class=OrjsonResponse
+    )
     
     # Configure CORS
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
+        allow_origins=DASHBOARD["allowed_origins"],
         allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        allow_methods=["GET", "POST"],
+        allow_headers=["Authorization", "Content-Type"],
     )
     
     # Security functions
@@ -86,9 +111,9 @@ def create_dashboard_app(system) -> FastAPI:
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         to_encode = data.copy()
         if expires_delta:
-            expire = datetime.utcnow() + expires_delta
+            expire = datetime.now(timezone.utc) + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
+            expire = datetime.now(timezone.utc) + timedelta(minutes=15)
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
@@ -99,15 +124,22 @@ def create_dashboard_app(system) -> FastAPI:
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
+        cache_key = hashlib.sha256(token.encode()).digest()
+        cached = token_cache.get(cache_key)
+        if cached is not None and cached[1] > time.time():
+            username = cached[0]
+        else:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                username: str = payload.get("sub")
+                if username is None:
+                    raise credentials_exception
+                token_data = TokenData(username=username)
+            except InvalidTokenError:
                 raise credentials_exception
-            token_data = TokenData(username=username)
-        except JWTError:
-            raise credentials_exception
-        user = get_user(fake_users_db, username=token_data.username)
+            username = token_data.username
+            token_cache[cache_key] = (username, payload.get("exp", 0))
+        user = get_user(fake_users_db, username=username)
         if user is None:
             raise credentials_exception
         return user
@@ -115,7 +147,11 @@ def create_dashboard_app(system) -> FastAPI:
     # Routes
     @app.post("/token", response_model=Token)
     async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-        user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+        loop = asyncio.get_running_loop()
+        user = await loop.run_in_executor(
+            crypto_executor, authenticate_user,
+            fake_users_db, form_data.username, form_data.password
+        )
         if not user:
             raise HTTPException(
                 status_code=401,
@@ -156,12 +192,16 @@ def create_dashboard_app(system) -> FastAPI:
         current_user: User = Depends(get_current_user)
     ):
         """Get historical traffic data."""
-        metrics = await system.db.get_historical_metrics(start_time, end_time)
-        states = await system.db.get_signal_states(start_time, end_time)
-        return {
+        # Independent queries; each runs on its own pooled read connection
+        metrics, states = await asyncio.gather(
+            system.db.get_historical_metrics(start_time, end_time),
+            system.db.get_signal_states(start_time, end_time)
+        )
+        # Returned directly so orjson serializes the metric arrays natively
+        return OrjsonResponse({
             "metrics": metrics,
             "states": states
-        }
+        })
     
     @app.post("/emergency/reset")
     async def reset_emergency(current_user: User = Depends(get_current_user)):
@@ -1,19 +1,38 @@
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 
 import cv2
 import numpy as np
 from ultralytics import YOLO
 from loguru import logger
 
+from config.settings import VISION
+from utils.queues import put_latest
+from utils.records import DetectionSample
+
+# Capture and inference share the detector's worker thread with a
+# multi-threaded model, so keep OpenCV from spinning up its own worker
+# pool and oversubscribing cores
+cv2.setNumThreads(1)
+
 class VehicleDetector:
-    def __init__(self, model_path: Optional[Path] = None):
+    def __init__(self, model_path: Optional[Path] = None, detection_queue: Optional[asyncio.Queue[DetectionSample]] = None):
         """Initialize the vehicle detector with YOLOv8 model."""
-        self.model = YOLO('yolov8n.pt')  # Load the smallest YOLOv8 model
+        self.model = self._load_model(Path(model_path or VISION["model_path"]))
+        self.detection_queue = detection_queue
         self.cap: Optional[cv2.VideoCapture] = None
         self.is_running = False
         self.detection_interval = 0.1  # seconds
+        self._next_detection = 0.0
+        self._task: Optional[asyncio.Task] = None
+        
+        # Capture and inference block, so they run on one worker thread
+        # that owns the VideoCapture while the event loop keeps serving
+        # the rest of the pipeline
+        self._executor: Optional[ThreadPoolExecutor] = None
         self.confidence_threshold = 0.5
         
         # Vehicle classes in COCO dataset
@@ -23,78 +42,165 @@ class VehicleDetector:
             5: 'bus',
             7: 'truck'
         }
+        
+        # Boolean lookup table indexed by class id for filtering boxes in bulk;
+        # sized to cover the COCO ids even for models with fewer classes
+        mask_size = max(len(self.model.names), max(self.vehicle_classes) + 1)
+        self._vehicle_mask = np.zeros(mask_size, dtype=bool)
+        self._vehicle_mask[list(self.vehicle_classes)] = True
+        
+        # Run one inference up front so engine build/CUDA context setup
+        # doesn't stall the first real frame
+        self._warmup()
+    
+    def _load_model(self, model_path: Path) -> YOLO:
+        """Load the YOLO model, exporting it to the configured runtime once."""
+        export_format = VISION["export_format"]
+        if not export_format or model_path.suffix != '.pt':
+            return YOLO(str(model_path), task='detect')
+        
+        if export_format == 'openvino':
+            exported = model_path.with_name(f"{model_path.stem}_openvino_model")
+        else:
+            exported = model_path.with_suffix(f".{export_format}")
+        
+        if not exported.exists():
+            logger.info(f"Exporting {model_path} to {export_format} format")
+            export_args = {
+                'format': export_format,
+                'half': VISION["half"],
+                'int8': VISION["int8"]
+            }
+            if VISION["device"]:
+                export_args['device'] = VISION["device"]
+            if VISION["int8"] and VISION["calibration_data"]:
+                export_args['data'] = VISION["calibration_data"]
+            exported = Path(YOLO(str(model_path)).export(**export_args))
+        
+        return YOLO(str(exported), task='detect')
     
-    async def start(self, camera_id: int = 0):
+    def _warmup(self):
+        """Run a dummy inference to initialize the model runtime."""
+        try:
+            self.model(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+        except Exception as e:
+            logger.warning(f"Model warmup failed: {e}")
+    
+    async def start(self, camera_id: Union[int, str] = 0):
         """Start the video capture and detection loop."""
-        self.cap = cv2.VideoCapture(camera_id)
+        if isinstance(camera_id, str):
+            # Network streams and files go through FFmpeg so NVDEC/VAAPI
+            # hardware decoding can be used where available
+            self.cap = cv2.VideoCapture(camera_id, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY
+            ])
+        else:
+            self.cap = cv2.VideoCapture(camera_id)
         if not self.cap.isOpened():
             raise RuntimeError(f"Failed to open camera {camera_id}")
         
         self.is_running = True
-        asyncio.create_task(self._detection_loop())
+        self._next_detection = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector")
+        self._task = asyncio.create_task(self._detection_loop(), name="vehicle-detector")
         logger.info("Vehicle detector started")
     
     async def stop(self):
         """Stop the video capture and detection loop."""
         self.is_running = False
+        if self._task:
+            # Let the in-flight frame finish so the capture isn't released
+            # underneath the worker thread
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Error stopping detection loop: {e}")
+            self._task = None
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
         if self.cap:
             self.cap.release()
         logger.info("Vehicle detector stopped")
     
     async def _detection_loop(self):
         """Main detection loop that processes frames and detects vehicles."""
+        loop = asyncio.get_running_loop()
+        
         while self.is_running:
             try:
-                ret, frame = self.cap.read()
-                if not ret:
-                    logger.error("Failed to read frame from camera")
-                    continue
-                
-                # Run detection
-                results = self.model(frame, conf=self.confidence_threshold)
-                
-                # Process detections
-                detections = self._process_detections(results[0])
+                sample = await loop.run_in_executor(self._executor, self._capture_and_detect)
                 
-                # TODO: Send detections to traffic analyzer
-                
-                await asyncio.sleep(self.detection_interval)
+                # Hand the newest sample to the traffic analyzer
+                if sample is not None and self.detection_queue is not None:
+                    put_latest(self.detection_queue, sample)
                 
             except Exception as e:
                 logger.error(f"Error in detection loop: {e}")
                 await asyncio.sleep(1)  # Wait before retrying
     
-    def _process_detections(self, result) -> List[Dict]:
-        """Process YOLO detections and extract relevant information."""
-        detections = []
+    def _capture_and_detect(self) -> Optional[DetectionSample]:
+        """Grab frames until a detection is due and run the model on the latest one."""
+        # Grab every frame to keep the capture buffer current, but only
+        # decode the ones that are actually run through the model
+        while True:
+            if not self.is_running:
+                return None
+            if not self.cap.grab():
+                raise RuntimeError("Failed to grab frame from camera")
+            now = time.monotonic()
+            if now >= self._next_detection:
+                break
+        self._next_detection = now + self.detection_interval
         
-        for box in result.boxes:
-            cls = int(box.cls[0])
-            if cls in self.vehicle_classes:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                confidence = float(box.conf[0])
-                
-                detections.append({
-                    'class': self.vehicle_classes[cls],
-                    'confidence': confidence,
-                    'bbox': (x1, y1, x2, y2)
-                })
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            raise RuntimeError("Failed to decode frame from camera")
+        
+        # Run detection
+        results = self.model(frame, conf=self.confidence_threshold)
         
-        return detections
+        # Keep the vehicle boxes as an array; per-box dicts are only built
+        # by _process_detections when a caller needs them
+        vehicles = self._filter_vehicles(results[0])
+        
+        frame_area = frame.shape[0] * frame.shape[1]
+        return DetectionSample(
+            timestamp=now,
+            vehicle_count=len(vehicles),
+            queue_length=self.get_queue_length(vehicles),
+            density=self.get_traffic_density(vehicles[:, :4], frame_area)
+        )
+    
+    def _filter_vehicles(self, result) -> np.ndarray:
+        """Keep only the vehicle rows of a YOLO result."""
+        # Columns: x1, y1, x2, y2, [track id,] confidence, class
+        data = result.boxes.data.cpu().numpy()
+        return data[self._vehicle_mask[data[:, -1].astype(np.intp)]]
     
-    def get_queue_length(self, detections: List[Dict]) -> int:
+    def _process_detections(self, vehicles: np.ndarray) -> List[Dict]:
+        """Process vehicle detections and extract relevant information."""
+        return [{
+            'class': self.vehicle_classes[cls],
+            'confidence': confidence,
+            'bbox': tuple(bbox)
+        } for bbox, confidence, cls in zip(
+            vehicles[:, :4].tolist(),
+            vehicles[:, -2].tolist(),
+            vehicles[:, -1].astype(int).tolist()
+        )]
+    
+    def get_queue_length(self, vehicles: np.ndarray) -> int:
         """Estimate queue length based on vehicle detections."""
         # TODO: Implement queue length estimation logic
-        return len(detections)
+        return len(vehicles)
     
-    def get_traffic_density(self, detections: List[Dict], frame_area: float) -> float:
-        """Calculate traffic density based on vehicle detections."""
-        if not detections:
+    def get_traffic_density(self, bboxes: np.ndarray, frame_area: float) -> float:
+        """Calculate traffic density from an (N, 4) array of x1, y1, x2, y2 boxes."""
+        if not len(bboxes):
             return 0.0
         
-        total_vehicle_area = sum(
-            (d['bbox'][2] - d['bbox'][0]) * (d['bbox'][3] - d['bbox'][1])
-            for d in detections
-        )
+        widths = bboxes[:, 2] - bboxes[:, 0]
+        heights = bboxes[:, 3] - bboxes[:, 1]
         
-        return total_vehicle_area / frame_area 
\ No newline at end of file
+        return float((widths * heights).sum()) / frame_area
\ No newline at end of file
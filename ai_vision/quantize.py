@@ -0,0 +1,91 @@
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from ultralytics import YOLO
+from loguru import logger
+
+IMAGE_SIZE = 640
+INPUT_NAME = "images"  # Input tensor name of Ultralytics ONNX exports
+FRAME_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+def preprocess_frame(frame: np.ndarray, size: int = IMAGE_SIZE) -> np.ndarray:
+    """Letterbox a BGR frame into the 1x3xHxW float tensor YOLOv8 expects."""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(frame, (round(width * scale), round(height * scale)))
+    
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    
+    # BGR HWC -> RGB CHW, scaled to [0, 1]
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor[np.newaxis])
+
+class FrameCalibrationReader(CalibrationDataReader):
+    def __init__(self, frame_paths: List[Path]):
+        """Feed saved camera frames to the INT8 calibrator."""
+        self._frames: Iterator[Path] = iter(frame_paths)
+    
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        for path in self._frames:
+            frame = cv2.imread(str(path))
+            if frame is None:
+                logger.warning(f"Skipping unreadable calibration frame {path}")
+                continue
+            return {INPUT_NAME: preprocess_frame(frame)}
+        return None
+
+def quantize_model(model_path: Path, frames_dir: Path, output_path: Path, max_frames: int = 300) -> Path:
+    """Export a YOLOv8 model to ONNX and statically quantize it to INT8."""
+    frame_paths = sorted(
+        p for p in frames_dir.iterdir() if p.suffix.lower() in FRAME_SUFFIXES
+    )[:max_frames]
+    if not frame_paths:
+        raise RuntimeError(f"No calibration frames found in {frames_dir}")
+    
+    fp32_path = Path(YOLO(str(model_path)).export(format='onnx', imgsz=IMAGE_SIZE))
+    prepared_path = fp32_path.with_name(f"{fp32_path.stem}_prep.onnx")
+    quant_pre_process(str(fp32_path), str(prepared_path))
+    
+    logger.info(f"Calibrating on {len(frame_paths)} frames from {frames_dir}")
+    quantize_static(
+        str(prepared_path),
+        str(output_path),
+        FrameCalibrationReader(frame_paths),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8
+    )
+    
+    # Carry over the class names/stride metadata Ultralytics reads on load
+    source = onnx.load(str(fp32_path))
+    quantized = onnx.load(str(output_path))
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, str(output_path))
+    
+    prepared_path.unlink(missing_ok=True)
+    logger.info(f"Saved INT8 model to {output_path}")
+    return output_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an INT8 ONNX model for CPU inference")
+    parser.add_argument("frames_dir", type=Path, help="directory of saved camera frames")
+    parser.add_argument("--model", type=Path, default=Path("yolov8n.pt"))
+    parser.add_argument("--output", type=Path, default=Path("yolov8n_int8.onnx"))
+    parser.add_argument("--max-frames", type=int, default=300)
+    args = parser.parse_args()
+    
+    quantize_model(args.model, args.frames_dir, args.output, args.max_frames)
+
+if __name__ == "__main__":
+    main()
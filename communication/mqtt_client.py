@@ -1,55 +1,88 @@
 import asyncio
-import json
 from typing import Callable, Dict, Optional
 
-import paho.mqtt.client as mqtt
+import aiomqtt
+import orjson
 from loguru import logger
 
+from utils.records import TrafficMetrics
+
+# Emergency status only has two possible payloads, so encode them once
+EMERGENCY_PAYLOADS = {
+    True: orjson.dumps({"emergency": True}),
+    False: orjson.dumps({"emergency": False})
+}
+
 class MQTTClient:
     def __init__(self, broker: str = "localhost", port: int = 1883):
         """Initialize the MQTT client."""
         self.broker = broker
         self.port = port
-        self.client = mqtt.Client()
+        self.client: Optional[aiomqtt.Client] = None
         self.is_connected = False
-        
-        # Set up callbacks
-        self.client.on_connect = self._on_connect
-        self.client.on_disconnect = self._on_disconnect
-        self.client.on_message = self._on_message
+        self.reconnect_interval = 5.0  # seconds
+        self._listen_task: Optional[asyncio.Task] = None
         
         # Message handlers
         self.message_handlers: Dict[str, Callable] = {}
+        
+        # Publish topics per intersection
+        self._topics: Dict[str, Dict[str, str]] = {}
     
-    def _on_connect(self, client, userdata, flags, rc):
-        """Handle connection callback."""
-        if rc == 0:
-            self.is_connected = True
-            logger.info("Connected to MQTT broker")
-            
-            # Subscribe to topics
-            self.client.subscribe("traffic/+/metrics")
-            self.client.subscribe("traffic/+/state")
-            self.client.subscribe("traffic/+/emergency")
-        else:
-            logger.error(f"Failed to connect to MQTT broker with code: {rc}")
+    async def _open(self):
+        """Open a broker session and subscribe to neighbour topics."""
+        # aiomqtt clients are reusable, so one client serves every reconnect
+        if self.client is None:
+            self.client = aiomqtt.Client(self.broker, self.port)
+        await self.client.__aenter__()
+        self.is_connected = True
+        logger.info("Connected to MQTT broker")
+        
+        # Subscribe to topics
+        try:
+            await self.client.subscribe("traffic/+/metrics")
+            await self.client.subscribe("traffic/+/state")
+            await self.client.subscribe("traffic/+/emergency")
+        except aiomqtt.MqttError:
+            await self._close()
+            raise
     
-    def _on_disconnect(self, client, userdata, rc):
-        """Handle disconnection callback."""
+    async def _close(self):
+        """Close the current broker session so the client can be reopened."""
         self.is_connected = False
-        logger.info("Disconnected from MQTT broker")
+        try:
+            await self.client.__aexit__(None, None, None)
+        except aiomqtt.MqttError as e:
+            logger.warning(f"Error closing MQTT session: {e}")
+    
+    async def _listen(self):
+        """Dispatch incoming messages, reconnecting if the broker drops."""
+        while True:
+            try:
+                async for message in self.client.messages:
+                    self._on_message(message)
+            except aiomqtt.MqttError as e:
+                logger.error(f"Lost connection to MQTT broker: {e}")
+                await self._close()
+            
+            while not self.is_connected:
+                await asyncio.sleep(self.reconnect_interval)
+                try:
+                    await self._open()
+                except aiomqtt.MqttError as e:
+                    logger.error(f"Failed to reconnect to MQTT broker: {e}")
     
-    def _on_message(self, client, userdata, msg):
+    def _on_message(self, message: aiomqtt.Message):
         """Handle incoming messages."""
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
+            topic = message.topic.value
+            payload = orjson.loads(message.payload)
             
             # Call appropriate handler if registered
             if topic in self.message_handlers:
                 self.message_handlers[topic](payload)
             else:
-                logger.debug(f"Received message on topic {topic}: {payload}")
+                logger.debug("Received message on topic {}: {}", topic, payload)
                 
         except Exception as e:
             logger.error(f"Error processing message: {e}")
@@ -57,8 +90,8 @@ class MQTTClient:
     async def connect(self):
         """Connect to the MQTT broker."""
         try:
-            self.client.connect(self.broker, self.port)
-            self.client.loop_start()
+            await self._open()
+            self._listen_task = asyncio.create_task(self._listen())
         except Exception as e:
             logger.error(f"Failed to connect to MQTT broker: {e}")
             raise
@@ -66,32 +99,52 @@ class MQTTClient:
     async def disconnect(self):
         """Disconnect from the MQTT broker."""
         try:
-            self.client.loop_stop()
-            self.client.disconnect()
+            if self._listen_task:
+                self._listen_task.cancel()
+                try:
+                    await self._listen_task
+                except asyncio.CancelledError:
+                    pass
+                self._listen_task = None
+            if self.is_connected:
+                await self._close()
+                logger.info("Disconnected from MQTT broker")
         except Exception as e:
             logger.error(f"Error disconnecting from MQTT broker: {e}")
     
-    def publish_metrics(self, intersection_id: str, metrics: Dict):
+    def register_intersection(self, intersection_id: str) -> Dict[str, str]:
+        """Precompute the publish topics for an intersection."""
+        topics = self._topics[intersection_id] = {
+            kind: f"traffic/{intersection_id}/{kind}"
+            for kind in ("metrics", "state", "emergency")
+        }
+        return topics
+    
+    def _get_topics(self, intersection_id: str) -> Dict[str, str]:
+        """Get the publish topics for an intersection."""
+        return self._topics.get(intersection_id) or self.register_intersection(intersection_id)
+    
+    async def publish_metrics(self, intersection_id: str, metrics: TrafficMetrics):
         """Publish traffic metrics."""
         try:
-            topic = f"traffic/{intersection_id}/metrics"
-            self.client.publish(topic, json.dumps(metrics))
+            topic = self._get_topics(intersection_id)["metrics"]
+            await self.client.publish(topic, orjson.dumps(metrics))
         except Exception as e:
             logger.error(f"Failed to publish metrics: {e}")
     
-    def publish_state(self, intersection_id: str, state: Dict):
+    async def publish_state(self, intersection_id: str, state: Dict):
         """Publish traffic light state."""
         try:
-            topic = f"traffic/{intersection_id}/state"
-            self.client.publish(topic, json.dumps(state))
+            topic = self._get_topics(intersection_id)["state"]
+            await self.client.publish(topic, orjson.dumps(state))
         except Exception as e:
             logger.error(f"Failed to publish state: {e}")
     
-    def publish_emergency(self, intersection_id: str, emergency: bool):
+    async def publish_emergency(self, intersection_id: str, emergency: bool):
         """Publish emergency status."""
         try:
-            topic = f"traffic/{intersection_id}/emergency"
-            self.client.publish(topic, json.dumps({"emergency": emergency}))
+            topic = self._get_topics(intersection_id)["emergency"]
+            await self.client.publish(topic, EMERGENCY_PAYLOADS[emergency])
         except Exception as e:
             logger.error(f"Failed to publish emergency status: {e}")
     
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Union
 
 # Base paths
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,16 +23,29 @@ MQTT = {
     "broker": os.getenv("MQTT_BROKER", "localhost"),
     "port": int(os.getenv("MQTT_PORT", "1883")),
     "client_id": os.getenv("MQTT_CLIENT_ID", "traffic_light_1"),
+    "intersection_id": os.getenv("INTERSECTION_ID", "intersection_1"),
     "username": os.getenv("MQTT_USERNAME", ""),
     "password": os.getenv("MQTT_PASSWORD", "")
 }
 
+def parse_camera_id(value: str) -> Union[int, str]:
+    """Parse a camera index, keeping stream URLs and file paths as strings."""
+    return int(value) if value.isdigit() else value
+
 # AI Vision settings
 VISION = {
     "model_path": os.getenv("YOLO_MODEL_PATH", "yolov8n.pt"),
+    # Optimized runtime to export the .pt model to: "engine" (TensorRT),
+    # "openvino" or "onnx". Empty runs the PyTorch model directly.
+    "export_format": os.getenv("YOLO_EXPORT_FORMAT", ""),
+    "device": os.getenv("YOLO_DEVICE", ""),  # e.g. "0" for the first GPU
+    "half": os.getenv("YOLO_HALF", "True").lower() == "true",
+    "int8": os.getenv("YOLO_INT8", "False").lower() == "true",
+    "calibration_data": os.getenv("YOLO_CALIBRATION_DATA", ""),  # dataset yaml for INT8
     "confidence_threshold": 0.5,
     "detection_interval": 0.1,  # seconds
-    "camera_id": int(os.getenv("CAMERA_ID", "0"))
+    # Device index, or an RTSP/HTTP URL or video file decoded through FFmpeg
+    "camera_id": parse_camera_id(os.getenv("CAMERA_ID", "0"))
 }
 
 # Traffic light timing settings
@@ -63,7 +76,13 @@ LOGGING = {
 DASHBOARD = {
     "host": os.getenv("DASHBOARD_HOST", "0.0.0.0"),
     "port": int(os.getenv("DASHBOARD_PORT", "8000")),
-    "debug": os.getenv("DASHBOARD_DEBUG", "False").lower() == "true"
+    "debug": os.getenv("DASHBOARD_DEBUG", "False").lower() == "true",
+    # Comma-separated list of origins allowed to call the dashboard API
+    "allowed_origins": [
+        origin.strip()
+        for origin in os.getenv("DASHBOARD_ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+        if origin.strip()
+    ]
 }
 
 def get_settings() -> Dict[str, Any]:
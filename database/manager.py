@@ -1,27 +1,117 @@
 import asyncio
-from datetime import datetime
+import random
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import aiosqlite
+import numpy as np
 from loguru import logger
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Hot-path statements live in one place so the writer and readers share
+# the same SQL; sqlite3 caches prepared statements by their text
+INSERT_TRAFFIC_METRICS = """
+    INSERT INTO traffic_metrics (
+        timestamp, vehicle_count, queue_length,
+        traffic_density, average_wait_time
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+
+INSERT_SIGNAL_STATE = """
+    INSERT INTO signal_states (
+        timestamp, phase, duration, is_emergency
+    ) VALUES (?, ?, ?, ?)
+"""
+
+SELECT_TRAFFIC_METRICS = """
+    SELECT
+        timestamp, vehicle_count, queue_length,
+        traffic_density, average_wait_time
+    FROM traffic_metrics
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp ASC
+"""
+
+SELECT_SIGNAL_STATES = """
+    SELECT timestamp, phase, duration, is_emergency
+    FROM signal_states
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp ASC
+"""
+
+def to_epoch_ns(value: datetime) -> int:
+    """Convert a datetime (naive values are taken as UTC) to epoch nanoseconds."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "traffic_data.db"):
+    def __init__(
+        self,
+        db_path: str = "traffic_data.db",
+        flush_interval: float = 0.5,
+        max_batch_size: int = 500,
+        read_pool_size: int = 4,
+        checkpoint_interval: float = 60.0,
+        max_pending: int = 5000,
+        max_backoff: float = 30.0
+    ):
         """Initialize the database manager."""
         self.db_path = db_path
         self.connection: Optional[aiosqlite.Connection] = None
+        
+        # Read-only connections so queries run alongside the write path.
+        # They don't flush first, so buffered rows become visible once the
+        # background writer commits them, within flush_interval
+        self.read_pool_size = read_pool_size
+        self._readers: List[aiosqlite.Connection] = []
+        self._next_reader = 0
+        
+        # Write buffers, flushed in one transaction every flush_interval
+        # seconds or once max_batch_size rows are pending
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        # Rows buffered per table before writers should wait; beyond this
+        # the oldest rows are dropped so a failing database can't exhaust memory
+        self.max_pending = max_pending
+        self._dropped_rows = 0
+        self._drop_events = 0
+        self._metric_buf: List[Tuple] = []
+        self._state_buf: List[Tuple] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_wakeup = asyncio.Event()
+        self.max_backoff = max_backoff  # longest wait between failed flushes
+        
+        # WAL checkpoints run from a background task between write bursts
+        # instead of inline on whichever commit crosses the threshold
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_task: Optional[asyncio.Task] = None
     
     async def initialize(self):
         """Initialize the database and create tables."""
         try:
             self.connection = await aiosqlite.connect(self.db_path)
+            await self._configure_connection(self.connection)
+            
+            # Page size only takes effect on a new database, so set it before WAL
+            await self.connection.execute("PRAGMA page_size=8192")
+            
+            # WAL lets commits append to the log instead of rewriting pages,
+            # and NORMAL only fsyncs at checkpoints
+            await self.connection.execute("PRAGMA journal_mode=WAL")
+            await self.connection.execute("PRAGMA synchronous=NORMAL")
+            await self.connection.execute("PRAGMA temp_store=MEMORY")
+            await self.connection.execute("PRAGMA wal_autocheckpoint=10000")
             
             # Create tables
             await self.connection.execute("""
                 CREATE TABLE IF NOT EXISTS traffic_metrics (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME NOT NULL,
+                    timestamp INTEGER NOT NULL,  -- epoch nanoseconds (UTC)
                     vehicle_count INTEGER NOT NULL,
                     queue_length INTEGER NOT NULL,
                     traffic_density REAL NOT NULL,
@@ -39,7 +129,43 @@ class DatabaseManager:
                 )
             """)
             
+            # Databases created before timestamps moved to epoch nanoseconds
+            # hold them as UTC datetime text; convert those rows in place so
+            # they stay inside the numeric range scans
+            cursor = await self.connection.execute("""
+                UPDATE traffic_metrics
+                SET timestamp = CAST((julianday(timestamp) - 2440587.5) * 86400e9 AS INTEGER)
+                WHERE typeof(timestamp) = 'text' AND julianday(timestamp) IS NOT NULL
+            """)
+            if cursor.rowcount > 0:
+                logger.info(f"Converted {cursor.rowcount} traffic metrics timestamps to epoch nanoseconds")
+            
+            # Covering indexes so time-range queries are index-only scans
+            await self.connection.execute("""
+                CREATE INDEX IF NOT EXISTS idx_traffic_metrics_timestamp
+                ON traffic_metrics (
+                    timestamp, vehicle_count, queue_length,
+                    traffic_density, average_wait_time
+                )
+            """)
+            
+            await self.connection.execute("""
+                CREATE INDEX IF NOT EXISTS idx_signal_states_timestamp
+                ON signal_states (timestamp, phase, duration, is_emergency)
+            """)
+            
             await self.connection.commit()
+            
+            # WAL readers see committed data without blocking the writer
+            if self.db_path != ":memory:":
+                uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+                for _ in range(self.read_pool_size):
+                    reader = await aiosqlite.connect(uri, uri=True)
+                    await self._configure_connection(reader)
+                    self._readers.append(reader)
+            
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
             logger.info("Database initialized successfully")
             
         except Exception as e:
@@ -47,65 +173,170 @@ class DatabaseManager:
             raise
     
     async def close(self):
-        """Close the database connection."""
+        """Flush pending writes and close the database connection."""
+        for task in (self._flush_task, self._checkpoint_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._flush_task = None
+        self._checkpoint_task = None
+        
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        
         if self.connection:
+            await self.flush()
             await self.connection.close()
             logger.info("Database connection closed")
     
-    async def store_traffic_metrics(self, timestamp: datetime, metrics: Dict):
-        """Store traffic metrics in the database."""
-        try:
-            await self.connection.execute("""
-                INSERT INTO traffic_metrics (
-                    timestamp, vehicle_count, queue_length,
-                    traffic_density, average_wait_time
-                ) VALUES (?, ?, ?, ?, ?)
-            """, (
-                timestamp,
-                metrics['vehicle_count'],
-                metrics['queue_length'],
-                metrics['traffic_density'],
-                metrics['average_wait_time']
-            ))
+    async def _configure_connection(self, connection: aiosqlite.Connection):
+        """Apply per-connection cache settings."""
+        # 64 MiB page cache, and serve reads from a 1 GiB memory map
+        await connection.execute("PRAGMA cache_size=-65536")
+        await connection.execute("PRAGMA mmap_size=1073741824")
+    
+    def _get_reader(self) -> aiosqlite.Connection:
+        """Pick a read connection round-robin, or the writer if there are none."""
+        if not self._readers:
+            return self.connection
+        reader = self._readers[self._next_reader]
+        self._next_reader = (self._next_reader + 1) % len(self._readers)
+        return reader
+    
+    async def _flush_loop(self):
+        """Periodically write buffered rows to the database."""
+        failures = 0
+        while True:
+            # Wake early when a buffer fills up
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
             
-            await self.connection.commit()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Back off exponentially (with jitter) while the database keeps
+                # failing, and only log the first few failures and every 50th
+                failures += 1
+                if failures <= 5 or failures % 50 == 0:
+                    logger.error(f"Failed to flush buffered writes (failure {failures}): {e}")
+                delay = min(self.max_backoff, self.flush_interval * 2 ** min(failures, 10))
+                await asyncio.sleep(delay + random.random() * 0.1)
+            else:
+                if failures:
+                    logger.info(f"Database writes recovered after {failures} failed flushes")
+                failures = 0
+    
+    async def _checkpoint_loop(self):
+        """Periodically fold the WAL back into the database while ingest is quiet."""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            pending = len(self._metric_buf) + len(self._state_buf)
+            if pending >= self.max_batch_size // 2:
+                continue
             
-        except Exception as e:
-            logger.error(f"Failed to store traffic metrics: {e}")
-            raise
+            try:
+                async with self._flush_lock:
+                    await self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e:
+                logger.error(f"Failed to checkpoint database: {e}")
+    
+    async def flush(self):
+        """Write all buffered rows in a single transaction."""
+        async with self._flush_lock:
+            metrics, self._metric_buf = self._metric_buf, []
+            states, self._state_buf = self._state_buf, []
+            if not metrics and not states:
+                return
+            
+            try:
+                if metrics:
+                    await self.connection.executemany(INSERT_TRAFFIC_METRICS, metrics)
+                
+                if states:
+                    await self.connection.executemany(INSERT_SIGNAL_STATE, states)
+                
+                await self.connection.commit()
+                
+            except Exception:
+                # Keep the rows for the next flush rather than dropping them
+                await self.connection.rollback()
+                self._metric_buf[:0] = metrics
+                self._state_buf[:0] = states
+                self._trim_buffer(self._metric_buf)
+                self._trim_buffer(self._state_buf)
+                raise
+    
+    def _trim_buffer(self, buffer: List[Tuple]):
+        """Drop the oldest rows once a write buffer holds more than max_pending."""
+        excess = len(buffer) - self.max_pending
+        if excess <= 0:
+            return
+        
+        del buffer[:excess]
+        self._dropped_rows += excess
+        self._drop_events += 1
+        if self._drop_events <= 5 or self._drop_events % 50 == 0:
+            logger.warning(f"Write backlog full, dropped {self._dropped_rows} oldest buffered rows so far")
+    
+    @property
+    def pending_writes(self) -> int:
+        """Number of rows buffered but not yet written."""
+        return len(self._metric_buf) + len(self._state_buf)
+    
+    def enqueue_traffic_metrics(self, timestamp_ns: int, metrics: Dict):
+        """Buffer traffic metrics for the background writer without waiting."""
+        self._metric_buf.append((
+            timestamp_ns,
+            metrics['vehicle_count'],
+            metrics['queue_length'],
+            metrics['traffic_density'],
+            metrics['average_wait_time']
+        ))
+        self._trim_buffer(self._metric_buf)
+        
+        if len(self._metric_buf) >= self.max_batch_size:
+            self._flush_wakeup.set()
+    
+    async def store_traffic_metrics(self, timestamp_ns: int, metrics: Dict):
+        """Buffer traffic metrics for the background writer."""
+        self.enqueue_traffic_metrics(timestamp_ns, metrics)
     
     async def store_signal_state(self, timestamp: datetime, phase: str, duration: float, is_emergency: bool):
-        """Store traffic light state in the database."""
+        """Buffer traffic light state for the next database flush."""
         try:
-            await self.connection.execute("""
-                INSERT INTO signal_states (
-                    timestamp, phase, duration, is_emergency
-                ) VALUES (?, ?, ?, ?)
-            """, (timestamp, phase, duration, is_emergency))
+            self._state_buf.append((timestamp, phase, duration, is_emergency))
+            self._trim_buffer(self._state_buf)
             
-            await self.connection.commit()
+            if len(self._state_buf) >= self.max_batch_size:
+                await self.flush()
             
         except Exception as e:
             logger.error(f"Failed to store signal state: {e}")
             raise
     
-    async def get_historical_metrics(self, start_time: datetime, end_time: datetime) -> List[Dict]:
-        """Retrieve historical traffic metrics."""
+    async def get_historical_metrics(self, start_time: datetime, end_time: datetime) -> Dict[str, np.ndarray]:
+        """Retrieve historical traffic metrics as one array per column."""
         try:
-            async with self.connection.execute("""
-                SELECT * FROM traffic_metrics
-                WHERE timestamp BETWEEN ? AND ?
-                ORDER BY timestamp ASC
-            """, (start_time, end_time)) as cursor:
+            async with self._get_reader().execute(
+                SELECT_TRAFFIC_METRICS, (to_epoch_ns(start_time), to_epoch_ns(end_time))
+            ) as cursor:
                 rows = await cursor.fetchall()
                 
-                return [{
-                    'timestamp': row[1],
-                    'vehicle_count': row[2],
-                    'queue_length': row[3],
-                    'traffic_density': row[4],
-                    'average_wait_time': row[5]
-                } for row in rows]
+                columns = tuple(zip(*rows)) if rows else ((),) * 5
+                return {
+                    'timestamp': np.array(columns[0], dtype=np.int64).astype('datetime64[ns]'),
+                    'vehicle_count': np.array(columns[1], dtype=np.int32),
+                    'queue_length': np.array(columns[2], dtype=np.int32),
+                    'traffic_density': np.array(columns[3], dtype=np.float64),
+                    'average_wait_time': np.array(columns[4], dtype=np.float64)
+                }
                 
         except Exception as e:
             logger.error(f"Failed to retrieve historical metrics: {e}")
@@ -114,18 +345,16 @@ class DatabaseManager:
     async def get_signal_states(self, start_time: datetime, end_time: datetime) -> List[Dict]:
         """Retrieve historical signal states."""
         try:
-            async with self.connection.execute("""
-                SELECT * FROM signal_states
-                WHERE timestamp BETWEEN ? AND ?
-                ORDER BY timestamp ASC
-            """, (start_time, end_time)) as cursor:
+            async with self._get_reader().execute(
+                SELECT_SIGNAL_STATES, (start_time, end_time)
+            ) as cursor:
                 rows = await cursor.fetchall()
                 
                 return [{
-                    'timestamp': row[1],
-                    'phase': row[2],
-                    'duration': row[3],
-                    'is_emergency': bool(row[4])
+                    'timestamp': row[0],
+                    'phase': row[1],
+                    'duration': row[2],
+                    'is_emergency': bool(row[3])
                 } for row in rows]
                 
         except Exception as e:
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 from fastapi import FastAPI
 from loguru import logger
@@ -12,29 +12,54 @@ from signal_controller.controller import SignalController
 from database.manager import DatabaseManager
 from communication.mqtt_client import MQTTClient
 from admin_dashboard.app import create_dashboard_app
+from config.settings import LOG_DIR, LOGGING, MQTT, VISION
+from utils.records import DetectionSample, TrafficMetrics
 
 class StoplightSystem:
     def __init__(self, config_path: Optional[Path] = None):
         self.logger = logger
         self.setup_logging()
         
+        # Pipeline queues between stages; a full queue drops its oldest item.
+        # The analyzer drains every detection sample once per tick, so that
+        # queue holds several seconds of samples; the others keep the newest.
+        self.detection_queue: asyncio.Queue[DetectionSample] = asyncio.Queue(maxsize=64)
+        self.metrics_queue: asyncio.Queue[TrafficMetrics] = asyncio.Queue(maxsize=1)
+        self.publish_queue: asyncio.Queue[Tuple[TrafficMetrics, Dict]] = asyncio.Queue(maxsize=1)
+        self.publish_task: Optional[asyncio.Task] = None
+        self.intersection_id = MQTT["intersection_id"]
+        
         # Initialize components
         self.db = DatabaseManager()
-        self.detector = VehicleDetector()
-        self.analyzer = TrafficAnalyzer(self.db)
-        self.controller = SignalController(self.analyzer)
+        self.detector = VehicleDetector(detection_queue=self.detection_queue)
+        self.analyzer = TrafficAnalyzer(
+            self.db,
+            detection_queue=self.detection_queue,
+            metrics_queue=self.metrics_queue
+        )
+        self.controller = SignalController(
+            self.analyzer,
+            metrics_queue=self.metrics_queue,
+            publish_queue=self.publish_queue
+        )
         self.mqtt_client = MQTTClient()
+        self.mqtt_client.register_intersection(self.intersection_id)
         
         # Initialize FastAPI app
         self.app = create_dashboard_app(self)
         
     def setup_logging(self):
         """Configure logging for the application."""
+        # Records are queued and written (as JSON) by loguru's worker thread,
+        # so logging from the async loops never blocks on file I/O
         self.logger.add(
-            "logs/stoplight_{time}.log",
-            rotation="1 day",
-            retention="7 days",
-            level="INFO"
+            str(LOG_DIR / "stoplight_{time}.log"),
+            rotation=LOGGING["rotation"],
+            retention=LOGGING["retention"],
+            compression="gz",
+            level=LOGGING["level"],
+            enqueue=True,
+            serialize=True
         )
     
     async def start(self):
@@ -47,7 +72,7 @@ class StoplightSystem:
             await self.mqtt_client.connect()
             
             # Start AI vision processing
-            await self.detector.start()
+            await self.detector.start(VISION["camera_id"])
             
             # Start traffic analysis
             await self.analyzer.start()
@@ -55,6 +80,9 @@ class StoplightSystem:
             # Start signal controller
             await self.controller.start()
             
+            # Start publishing to nearby intersections
+            self.publish_task = asyncio.create_task(self._publish_loop())
+            
             self.logger.info("Stoplight system started successfully")
             
         except Exception as e:
@@ -64,6 +92,14 @@ class StoplightSystem:
     async def stop(self):
         """Stop all system components gracefully."""
         try:
+            # Stop publishing before the MQTT client disconnects
+            if self.publish_task:
+                self.publish_task.cancel()
+                try:
+                    await self.publish_task
+                except asyncio.CancelledError:
+                    pass
+                self.publish_task = None
             await self.detector.stop()
             await self.analyzer.stop()
             await self.controller.stop()
@@ -75,6 +111,13 @@ class StoplightSystem:
         except Exception as e:
             self.logger.error(f"Error during system shutdown: {e}")
             raise
+    
+    async def _publish_loop(self):
+        """Publish the latest metrics and signal state over MQTT."""
+        while True:
+            metrics, state = await self.publish_queue.get()
+            await self.mqtt_client.publish_metrics(self.intersection_id, metrics)
+            await self.mqtt_client.publish_state(self.intersection_id, state)
 
 async def main():
     """Main entry point for the application."""
@@ -1,15 +1,25 @@
 import asyncio
-from datetime import datetime
-from typing import Dict, Optional
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
 from loguru import logger
 from traffic_analyzer.analyzer import TrafficAnalyzer
+from utils.queues import put_latest
+from utils.records import TrafficMetrics
 
 class SignalController:
-    def __init__(self, analyzer: TrafficAnalyzer):
+    def __init__(
+        self,
+        analyzer: TrafficAnalyzer,
+        metrics_queue: Optional[asyncio.Queue[TrafficMetrics]] = None,
+        publish_queue: Optional[asyncio.Queue[Tuple[TrafficMetrics, Dict]]] = None
+    ):
         """Initialize the signal controller with traffic analyzer."""
         self.analyzer = analyzer
+        self.metrics_queue = metrics_queue
+        self.publish_queue = publish_queue
         self.is_running = False
+        self._task: Optional[asyncio.Task] = None
         self.update_interval = 1.0  # seconds
         
         # Default timing configuration
@@ -20,12 +30,13 @@ class SignalController:
             'min_red': 10.0,
             'max_red': 60.0
         }
+        self._timing_bounds = self._build_timing_bounds()
         
         # Current state
         self.current_state = {
             'phase': 'red',  # red, yellow, green
             'remaining_time': 0.0,
-            'start_time': datetime.utcnow()
+            'start_time': datetime.now(timezone.utc)
         }
         
         # Emergency override
@@ -34,20 +45,30 @@ class SignalController:
     async def start(self):
         """Start the signal control loop."""
         self.is_running = True
-        asyncio.create_task(self._control_loop())
+        self._task = asyncio.create_task(self._control_loop())
         logger.info("Signal controller started")
     
     async def stop(self):
         """Stop the signal control loop."""
         self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
         logger.info("Signal controller stopped")
     
     async def _control_loop(self):
         """Main control loop that manages traffic light timing."""
         while self.is_running:
             try:
-                # Get current traffic metrics
-                metrics = self.analyzer.get_traffic_metrics()
+                # Wait for fresh metrics from the analyzer, or poll without a pipeline
+                if self.metrics_queue is not None:
+                    metrics = await self.metrics_queue.get()
+                else:
+                    metrics = self.analyzer.get_traffic_metrics()
                 
                 # Calculate optimal timing
                 timing = self.analyzer.calculate_optimal_timing()
@@ -59,7 +80,12 @@ class SignalController:
                 if self.analyzer.detect_emergency_vehicle([]):
                     await self._handle_emergency()
                 
-                await asyncio.sleep(self.update_interval)
+                # Hand metrics and the resulting state to the publisher
+                if self.publish_queue is not None:
+                    put_latest(self.publish_queue, (metrics, self.get_current_state()))
+                
+                if self.metrics_queue is None:
+                    await asyncio.sleep(self.update_interval)
                 
             except Exception as e:
                 logger.error(f"Error in control loop: {e}")
@@ -68,24 +94,18 @@ class SignalController:
     async def _update_signal_timing(self, timing: Dict[str, float]):
         """Update traffic light timing based on analysis."""
         # Ensure timing is within configured limits
-        timing['green_duration'] = max(
-            self.timing_config['min_green'],
-            min(timing['green_duration'], self.timing_config['max_green'])
-        )
-        
-        timing['red_duration'] = max(
-            self.timing_config['min_red'],
-            min(timing['red_duration'], self.timing_config['max_red'])
-        )
+        min_green, max_green, min_red, max_red = self._timing_bounds
+        timing['green_duration'] = max(min_green, min(timing['green_duration'], max_green))
+        timing['red_duration'] = max(min_red, min(timing['red_duration'], max_red))
         
         # Update current state
         self.current_state.update({
             'phase': 'green' if self.current_state['phase'] == 'red' else 'red',
             'remaining_time': timing['green_duration'] if self.current_state['phase'] == 'green' else timing['red_duration'],
-            'start_time': datetime.utcnow()
+            'start_time': datetime.now(timezone.utc)
         })
         
-        logger.info(f"Updated signal timing: {timing}")
+        logger.debug("Updated signal timing: {}", timing)
     
     async def _handle_emergency(self):
         """Handle emergency vehicle detection."""
@@ -95,7 +115,7 @@ class SignalController:
             self.current_state.update({
                 'phase': 'green',
                 'remaining_time': 30.0,  # Extended green time
-                'start_time': datetime.utcnow()
+                'start_time': datetime.now(timezone.utc)
             })
             logger.info("Emergency vehicle detected - forcing green light")
     
@@ -106,8 +126,14 @@ class SignalController:
     def set_timing_config(self, config: Dict[str, float]):
         """Update timing configuration."""
         self.timing_config.update(config)
+        self._timing_bounds = self._build_timing_bounds()
         logger.info(f"Updated timing configuration: {config}")
     
+    def _build_timing_bounds(self) -> Tuple[float, float, float, float]:
+        """Snapshot the green/red limits used when clamping timing."""
+        config = self.timing_config
+        return (config['min_green'], config['max_green'], config['min_red'], config['max_red'])
+    
     def reset_emergency_override(self):
         """Reset emergency override state."""
         self.emergency_override = False
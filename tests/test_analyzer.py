@@ -0,0 +1,137 @@
+import asyncio
+import random
+
+import pytest
+
+from traffic_analyzer.analyzer import TrafficAnalyzer
+from utils.records import DetectionSample, TrafficMetrics
+
+HISTORY_WINDOW = 5.0  # seconds
+TICK_INTERVAL = 0.5
+
+@pytest.fixture
+def clock():
+    """Settable time for the analyzer's clock, advanced by the tests."""
+    return [1000.0]
+
+def make_analyzer(clock) -> TrafficAnalyzer:
+    """Create an analyzer fed from a local queue, with no database."""
+    analyzer = TrafficAnalyzer(None, detection_queue=asyncio.Queue())
+    analyzer.history_window = HISTORY_WINDOW
+    analyzer.clock = lambda: clock[0]
+    return analyzer
+
+def tick(analyzer: TrafficAnalyzer, samples):
+    """Queue samples and run one metrics update, as the analysis loop does."""
+    async def run():
+        for sample in samples:
+            analyzer.detection_queue.put_nowait(sample)
+        await analyzer._update_metrics(await analyzer._get_new_samples())
+    asyncio.run(run())
+
+def test_window_matches_brute_force(clock):
+    """Incremental aggregates match a full recompute over the window on every tick."""
+    rng = random.Random(1)
+    analyzer = make_analyzer(clock)
+    history = []
+    
+    for step in range(60):
+        # Random bursts, with a quiet spell long enough to empty the window
+        count = 0 if 30 <= step < 42 else rng.randint(0, 15)
+        samples = [
+            DetectionSample(
+                timestamp=clock[0] + i * TICK_INTERVAL / 16,
+                vehicle_count=rng.randint(0, 30),
+                queue_length=rng.randint(0, 20),
+                density=rng.random(),
+                wait_time=rng.random() * 10 if rng.random() < 0.5 else None
+            )
+            for i in range(count)
+        ]
+        history.extend(samples)
+        clock[0] += TICK_INTERVAL
+        tick(analyzer, samples)
+        
+        window = [s for s in history if s.timestamp >= clock[0] - HISTORY_WINDOW]
+        metrics = analyzer.get_traffic_metrics()
+        if not window:
+            assert metrics == TrafficMetrics()
+            continue
+        
+        assert metrics.vehicle_count == round(sum(s.vehicle_count for s in window) / len(window))
+        assert metrics.queue_length == max(s.queue_length for s in window)
+        assert metrics.traffic_density == pytest.approx(
+            sum(s.density for s in window) / len(window)
+        )
+        
+        wait_times = [s.wait_time for s in window if s.wait_time is not None]
+        if wait_times:
+            assert metrics.average_wait_time == pytest.approx(sum(wait_times) / len(wait_times))
+
+def test_queue_max_falls_back_after_peak_expires(clock):
+    """The queue length drops to the next largest value once the peak leaves the window."""
+    analyzer = make_analyzer(clock)
+    tick(analyzer, [
+        DetectionSample(timestamp=clock[0], vehicle_count=12, queue_length=12, density=0.5),
+        DetectionSample(timestamp=clock[0] + 2, vehicle_count=8, queue_length=7, density=0.5),
+        DetectionSample(timestamp=clock[0] + 3, vehicle_count=4, queue_length=3, density=0.5)
+    ])
+    assert analyzer.get_traffic_metrics().queue_length == 12
+    assert analyzer.get_traffic_metrics().vehicle_count == 8
+    
+    clock[0] += HISTORY_WINDOW + 1
+    tick(analyzer, [])
+    assert analyzer.get_traffic_metrics().queue_length == 7
+    assert analyzer.get_traffic_metrics().vehicle_count == 6
+
+def test_empty_window_resets_snapshot(clock):
+    """Metrics drop back to empty once every sample has expired."""
+    analyzer = make_analyzer(clock)
+    tick(analyzer, [DetectionSample(timestamp=clock[0], vehicle_count=4, queue_length=4, density=0.2, wait_time=3.0)])
+    assert analyzer.get_traffic_metrics().vehicle_count == 4
+    
+    clock[0] += HISTORY_WINDOW + 1
+    tick(analyzer, [])
+    assert analyzer.get_traffic_metrics() == TrafficMetrics()
+    assert analyzer._density_sum == 0.0
+    assert analyzer._wait_count == 0
+
+class RecordingDatabase:
+    """Stand-in database that records enqueued metrics rows."""
+    def __init__(self):
+        self.rows = []
+        self.pending_writes = 0
+        self.max_pending = 5000
+    
+    def enqueue_traffic_metrics(self, timestamp_ns, metrics):
+        self.rows.append(metrics)
+
+def test_unchanged_metrics_written_on_heartbeat_only(clock):
+    """Unchanged metrics are written every heartbeat_ticks ticks, changed ones at once."""
+    db = RecordingDatabase()
+    analyzer = make_analyzer(clock)
+    analyzer.db = db
+    analyzer.heartbeat_ticks = 3
+    # Keep only the latest tick's samples so each snapshot reflects one sample
+    analyzer.history_window = TICK_INTERVAL
+    
+    def store_tick(samples):
+        clock[0] += TICK_INTERVAL
+        tick(analyzer, samples)
+        written = len(db.rows)
+        asyncio.run(analyzer._store_metrics())
+        return len(db.rows) > written
+    
+    def sample(density):
+        return DetectionSample(timestamp=clock[0], vehicle_count=4, queue_length=4, density=density)
+    
+    writes = [store_tick([sample(0.2)]) for _ in range(7)]
+    assert writes == [True, False, False, True, False, False, True]
+    
+    # Drift within the tolerance doesn't count as a change
+    analyzer.change_tolerance = 1e-3
+    assert not store_tick([sample(0.2 + 1e-4)])
+    
+    # A real change is written immediately, then the heartbeat restarts
+    writes = [store_tick([sample(0.9)]) for _ in range(4)]
+    assert writes == [True, False, False, True]
\ No newline at end of file
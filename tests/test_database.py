@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from database.manager import DatabaseManager, to_epoch_ns
+
+METRICS = {
+    'vehicle_count': 3,
+    'queue_length': 2,
+    'traffic_density': 0.25,
+    'average_wait_time': 4.0
+}
+
+def run(coro):
+    """Run a coroutine on a fresh event loop."""
+    return asyncio.run(coro)
+
+async def open_db(path) -> DatabaseManager:
+    """Open a database manager on a file so the read pool is used."""
+    db = DatabaseManager(str(path), flush_interval=60.0)
+    await db.initialize()
+    return db
+
+def test_to_epoch_ns_treats_naive_as_utc():
+    """Naive datetimes are UTC; aware ones are converted from their offset."""
+    naive = datetime(2026, 3, 1, 12, 30, 15, 250000)
+    aware = naive.replace(tzinfo=timezone.utc)
+    offset = aware.astimezone(timezone(timedelta(hours=-5)))
+    
+    expected = int(aware.timestamp()) * 1_000_000_000 + 250_000_000
+    assert to_epoch_ns(naive) == expected
+    assert to_epoch_ns(aware) == expected
+    assert to_epoch_ns(offset) == expected
+
+def test_to_epoch_ns_keeps_microseconds():
+    """Sub-second parts survive the conversion exactly."""
+    value = datetime(1970, 1, 1, 0, 0, 1, 500001, tzinfo=timezone.utc)
+    assert to_epoch_ns(value) == 1_500_001_000
+
+def test_historical_metrics_sub_second_precision(tmp_path):
+    """Timestamps round-trip at nanosecond precision and bounds are exact."""
+    async def scenario():
+        db = await open_db(tmp_path / "traffic.db")
+        try:
+            base = to_epoch_ns(datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc))
+            for offset in (0, 999, 1_000, 500_000_001):
+                db.enqueue_traffic_metrics(base + offset, METRICS)
+            await db.flush()
+            
+            start = datetime(2026, 3, 1, 12, 0, 0, 1, tzinfo=timezone.utc)
+            end = datetime(2026, 3, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+            return base, await db.get_historical_metrics(start, end)
+        finally:
+            await db.close()
+    
+    base, result = run(scenario())
+    # Only the row 1 µs after base falls inside [base + 1 µs, base + 0.5 s]
+    assert result['timestamp'].tolist() == [base + 1_000]
+    assert result['timestamp'].dtype == np.dtype('datetime64[ns]')
+
+def test_historical_metrics_naive_and_aware_bounds_agree(tmp_path):
+    """Naive bounds are read as UTC and match the same instant given with an offset."""
+    async def scenario():
+        db = await open_db(tmp_path / "traffic.db")
+        try:
+            moment = datetime(2026, 3, 1, 12, 0, 0, tzinfo=timezone.utc)
+            for minutes in (-10, 0, 10):
+                db.enqueue_traffic_metrics(to_epoch_ns(moment + timedelta(minutes=minutes)), METRICS)
+            await db.flush()
+            
+            naive = await db.get_historical_metrics(
+                datetime(2026, 3, 1, 11, 55), datetime(2026, 3, 1, 12, 5)
+            )
+            local = timezone(timedelta(hours=2))
+            aware = await db.get_historical_metrics(
+                datetime(2026, 3, 1, 13, 55, tzinfo=local), datetime(2026, 3, 1, 14, 5, tzinfo=local)
+            )
+            return to_epoch_ns(moment), naive, aware
+        finally:
+            await db.close()
+    
+    moment, naive, aware = run(scenario())
+    assert naive['timestamp'].tolist() == [moment]
+    assert aware['timestamp'].tolist() == [moment]
+
+def test_legacy_text_timestamps_are_migrated(tmp_path):
+    """Rows written with datetime text before the epoch-ns schema are converted on startup."""
+    path = tmp_path / "legacy.db"
+    legacy = datetime(2025, 6, 1, 8, 15, 30, 125000)
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE traffic_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME NOT NULL,
+            vehicle_count INTEGER NOT NULL,
+            queue_length INTEGER NOT NULL,
+            traffic_density REAL NOT NULL,
+            average_wait_time REAL NOT NULL
+        )
+    """)
+    connection.execute(
+        "INSERT INTO traffic_metrics (timestamp, vehicle_count, queue_length, traffic_density, average_wait_time) "
+        "VALUES (?, 5, 4, 0.5, 2.0)",
+        (legacy.isoformat(" "),)
+    )
+    connection.commit()
+    connection.close()
+    
+    async def scenario():
+        db = await open_db(path)
+        try:
+            return await db.get_historical_metrics(
+                legacy - timedelta(seconds=1), legacy + timedelta(seconds=1)
+            )
+        finally:
+            await db.close()
+    
+    result = run(scenario())
+    assert result['vehicle_count'].tolist() == [5]
+    # julianday() resolves to the millisecond
+    assert abs(result['timestamp'][0].astype(np.int64) - to_epoch_ns(legacy)) < 1_000_000
+    
+    connection = sqlite3.connect(path)
+    types = connection.execute("SELECT DISTINCT typeof(timestamp) FROM traffic_metrics").fetchall()
+    connection.close()
+    assert types == [('integer',)]
\ No newline at end of file
@@ -1,91 +1,274 @@
 import asyncio
-from datetime import datetime
-from typing import Dict, List, Optional
+import random
+import time
+from collections import deque
+from dataclasses import asdict
+from typing import Deque, Dict, List, Optional, Tuple
 
 from loguru import logger
 from database.manager import DatabaseManager
+from utils.queues import put_latest
+from utils.records import DetectionSample, TrafficMetrics
 
 class TrafficAnalyzer:
-    def __init__(self, db: DatabaseManager):
+    # One analyzer runs per intersection; fixed slots keep instances small
+    # and attribute access off the instance dict
+    __slots__ = (
+        'db', 'detection_queue', 'metrics_queue', 'is_running',
+        'analysis_interval', 'history_window', 'clock', 'max_backoff', '_fail_streak',
+        '_store_retry_at',
+        'heartbeat_ticks', 'change_tolerance', '_last_written',
+        '_heartbeat_counter', '_snapshot', '_timestamps', '_vehicle_counts',
+        '_densities', '_wait_times', '_vehicle_sum', '_density_sum',
+        '_wait_sum', '_wait_count', '_queue_max',
+        '_task'
+    )
+    
+    def __init__(
+        self,
+        db: DatabaseManager,
+        detection_queue: Optional[asyncio.Queue[DetectionSample]] = None,
+        metrics_queue: Optional[asyncio.Queue[TrafficMetrics]] = None
+    ):
         """Initialize the traffic analyzer with database connection."""
         self.db = db
+        self.detection_queue = detection_queue
+        self.metrics_queue = metrics_queue
         self.is_running = False
         self.analysis_interval = 1.0  # seconds
         self.history_window = 300  # seconds (5 minutes)
+        self.clock = time.monotonic  # must match the detector's sample timestamps
         
-        # Traffic metrics
-        self.current_metrics = {
-            'vehicle_count': 0,
-            'queue_length': 0,
-            'traffic_density': 0.0,
-            'average_wait_time': 0.0
-        }
+        # Back-pressure flushes back off while the database keeps failing
+        self.max_backoff = 30.0  # seconds
+        self._fail_streak = 0
+        self._store_retry_at = 0.0
+        
+        # Unchanged metrics are only rewritten every heartbeat_ticks ticks
+        self.heartbeat_ticks = 60
+        self.change_tolerance = 1e-3
+        self._last_written: Optional[TrafficMetrics] = None
+        self._heartbeat_counter = 0
+        
+        # Traffic metrics, replaced wholesale on each update so readers can
+        # share the reference without copying
+        self._snapshot = TrafficMetrics()
+        
+        # Detection samples within the history window, one column per field,
+        # kept so their contribution can be subtracted when they expire
+        self._timestamps: Deque[float] = deque()
+        self._vehicle_counts: Deque[int] = deque()
+        self._densities: Deque[float] = deque()
+        self._wait_times: Deque[Optional[float]] = deque()
+        
+        # Running aggregates over the window, updated per sample
+        self._vehicle_sum = 0
+        self._density_sum = 0.0
+        self._wait_sum = 0.0
+        self._wait_count = 0
+        
+        # (timestamp, queue_length) pairs with strictly decreasing queue
+        # length; the front is always the window maximum
+        self._queue_max: Deque[Tuple[float, int]] = deque()
+        
+        self._task: Optional[asyncio.Task] = None
     
     async def start(self):
         """Start the traffic analysis loop."""
         self.is_running = True
-        asyncio.create_task(self._analysis_loop())
+        self._task = asyncio.create_task(self._analysis_loop(), name="traffic-analyzer")
         logger.info("Traffic analyzer started")
     
     async def stop(self):
-        """Stop the traffic analysis loop."""
+        """Stop the traffic analysis loop and flush queued metrics."""
         self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        try:
+            await self.db.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush metrics on shutdown: {e}")
         logger.info("Traffic analyzer stopped")
     
     async def _analysis_loop(self):
         """Main analysis loop that processes traffic data."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        
         while self.is_running:
             try:
-                # Get historical data
-                historical_data = await self._get_historical_data()
+                # Get samples received since the last tick
+                new_samples = await self._get_new_samples()
                 
                 # Update current metrics
-                await self._update_metrics(historical_data)
+                await self._update_metrics(new_samples)
                 
-                # Store metrics in database
+                # Queue metrics for the database writer
                 await self._store_metrics()
                 
-                await asyncio.sleep(self.analysis_interval)
+                # Pass the fresh metrics on to the signal controller
+                if self.metrics_queue is not None:
+                    put_latest(self.metrics_queue, self.get_traffic_metrics())
                 
             except Exception as e:
                 logger.error(f"Error in analysis loop: {e}")
-                await asyncio.sleep(1)
+            
+            # Sleep to the next tick on a fixed cadence so processing time
+            # doesn't stretch the interval; missed ticks are skipped
+            next_tick += self.analysis_interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+    
+    async def _get_new_samples(self) -> List[DetectionSample]:
+        """Take the detection samples queued since the last call."""
+        samples = []
+        if self.detection_queue is not None:
+            while not self.detection_queue.empty():
+                samples.append(self.detection_queue.get_nowait())
+        return samples
+    
+    def _add_sample(self, sample: DetectionSample):
+        """Add a detection sample to the window aggregates."""
+        timestamp = sample.timestamp
+        self._timestamps.append(timestamp)
+        
+        vehicle_count = sample.vehicle_count
+        self._vehicle_counts.append(vehicle_count)
+        self._vehicle_sum += vehicle_count
+        
+        density = sample.density
+        self._densities.append(density)
+        self._density_sum += density
+        
+        wait_time = sample.wait_time
+        self._wait_times.append(wait_time)
+        if wait_time is not None:
+            self._wait_sum += wait_time
+            self._wait_count += 1
+        
+        # Older entries that can never be the maximum again are dropped
+        queue_length = sample.queue_length
+        queue_max = self._queue_max
+        while queue_max and queue_max[-1][1] <= queue_length:
+            queue_max.pop()
+        queue_max.append((timestamp, queue_length))
     
-    async def _get_historical_data(self) -> List[Dict]:
-        """Retrieve historical traffic data from database."""
-        # TODO: Implement database query for historical data
-        return []
+    def _evict_expired(self, cutoff: float):
+        """Remove samples older than cutoff from the window aggregates."""
+        timestamps = self._timestamps
+        vehicle_counts = self._vehicle_counts
+        densities = self._densities
+        wait_times = self._wait_times
+        while timestamps and timestamps[0] < cutoff:
+            timestamps.popleft()
+            self._vehicle_sum -= vehicle_counts.popleft()
+            self._density_sum -= densities.popleft()
+            wait_time = wait_times.popleft()
+            if wait_time is not None:
+                self._wait_sum -= wait_time
+                self._wait_count -= 1
+        
+        queue_max = self._queue_max
+        while queue_max and queue_max[0][0] < cutoff:
+            queue_max.popleft()
+        
+        # Drop accumulated rounding error whenever the window empties
+        if not timestamps:
+            self._density_sum = 0.0
+            self._wait_sum = 0.0
     
-    async def _update_metrics(self, historical_data: List[Dict]):
-        """Update current traffic metrics based on historical data."""
-        if not historical_data:
+    async def _update_metrics(self, new_samples: List[DetectionSample]):
+        """Update current traffic metrics with newly received samples."""
+        add_sample = self._add_sample
+        for sample in new_samples:
+            add_sample(sample)
+        self._evict_expired(self.clock() - self.history_window)
+        
+        # With no recent samples (e.g. a stalled camera) report empty metrics
+        # rather than republishing the last ones indefinitely
+        count = len(self._timestamps)
+        if not count:
+            self._snapshot = TrafficMetrics()
             return
         
-        # Calculate average wait time
-        wait_times = [d['wait_time'] for d in historical_data if 'wait_time' in d]
-        if wait_times:
-            self.current_metrics['average_wait_time'] = sum(wait_times) / len(wait_times)
-        
-        # Update other metrics
-        self.current_metrics.update({
-            'vehicle_count': len(historical_data),
-            'queue_length': max(d['queue_length'] for d in historical_data),
-            'traffic_density': sum(d['density'] for d in historical_data) / len(historical_data)
-        })
+        if self._wait_count:
+            average_wait_time = self._wait_sum / self._wait_count
+        else:
+            average_wait_time = self._snapshot.average_wait_time
+        
+        # Vehicles per frame, averaged over the window like density
+        self._snapshot = TrafficMetrics(
+            vehicle_count=round(self._vehicle_sum / count),
+            queue_length=self._queue_max[0][1],
+            traffic_density=self._density_sum / count,
+            average_wait_time=average_wait_time
+        )
+    
+    def _metrics_changed(self) -> bool:
+        """Check whether the snapshot differs from the last stored metrics."""
+        last = self._last_written
+        if last is None:
+            return True
+        
+        current = self._snapshot
+        tolerance = self.change_tolerance
+        return (
+            current.vehicle_count != last.vehicle_count
+            or current.queue_length != last.queue_length
+            or abs(current.traffic_density - last.traffic_density) > tolerance
+            or abs(current.average_wait_time - last.average_wait_time) > tolerance
+        )
     
     async def _store_metrics(self):
-        """Store current metrics in the database."""
+        """Queue current metrics for the database's background writer."""
+        # Skip writing identical rows, but keep a periodic heartbeat so the
+        # stored series has no long gaps
+        self._heartbeat_counter += 1
+        if not self._metrics_changed() and self._heartbeat_counter < self.heartbeat_ticks:
+            return
+        
         try:
-            await self.db.store_traffic_metrics(
-                timestamp=datetime.utcnow(),
-                metrics=self.current_metrics
+            # Only wait on the database when its backlog is full, and not
+            # while backing off from failed flushes
+            if self.db.pending_writes >= self.db.max_pending and self.clock() >= self._store_retry_at:
+                await self._flush_backlog()
+            
+            self.db.enqueue_traffic_metrics(
+                timestamp_ns=time.time_ns(),
+                metrics=asdict(self._snapshot)
             )
+            self._last_written = self._snapshot
+            self._heartbeat_counter = 0
         except Exception as e:
             logger.error(f"Failed to store metrics: {e}")
     
-    def get_traffic_metrics(self) -> Dict:
+    async def _flush_backlog(self):
+        """Flush the database's write backlog, backing off while it keeps failing."""
+        logger.warning(f"Database write backlog at {self.db.pending_writes} rows, flushing")
+        try:
+            await self.db.flush()
+            self._fail_streak = 0
+        except Exception as e:
+            # Back off exponentially (with jitter) while failures persist,
+            # and only log the first few and then every 50th
+            self._fail_streak += 1
+            if self._fail_streak <= 5 or self._fail_streak % 50 == 0:
+                logger.error(f"Failed to flush metrics backlog (failure {self._fail_streak}): {e}")
+            delay = min(self.max_backoff, 0.1 * 2 ** min(self._fail_streak, 10))
+            self._store_retry_at = self.clock() + delay + random.random() * 0.1
+    
+    def get_traffic_metrics(self) -> TrafficMetrics:
         """Get current traffic metrics."""
-        return self.current_metrics.copy()
+        return self._snapshot
     
     def calculate_optimal_timing(self) -> Dict[str, float]:
         """Calculate optimal traffic light timing based on current metrics."""
@@ -0,0 +1,12 @@
+import asyncio
+from typing import Any
+
+def put_latest(queue: asyncio.Queue, item: Any):
+    """Put an item on a bounded queue, dropping the oldest entry if it is full.
+    
+    Pipeline stages only care about the freshest data, so a slow consumer
+    should see the newest item rather than back-pressure its producer.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
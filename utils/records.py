@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(frozen=True, slots=True)
+class DetectionSample:
+    """Per-frame traffic sample produced by the vehicle detector."""
+    timestamp: float  # time.monotonic() when the frame was processed
+    vehicle_count: int  # vehicles detected in the frame
+    queue_length: int
+    density: float
+    wait_time: Optional[float] = None
+
+@dataclass(frozen=True, slots=True)
+class TrafficMetrics:
+    """Immutable snapshot of the analyzer's current metrics."""
+    vehicle_count: int = 0
+    queue_length: int = 0
+    traffic_density: float = 0.0
+    average_wait_time: float = 0.0
\ No newline at end of file